@@ -27,9 +27,19 @@ CV-2-04: Объединение нескольких масок цветов
 
 import os
 import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
 import cv2
 import numpy as np
 
+# numba необязательна: без неё маски строятся через cv2.inRange/cv2.bitwise_or
+try:
+	from numba import njit, prange
+	_HAS_NUMBA = True
+except ImportError:
+	_HAS_NUMBA = False
+
 # Импортируем всё необходимое из CV-1-12
 # import sys
 # sys.path.append(os.path.join(os.path.dirname(__file__), "../CV-1-12"))
@@ -38,6 +48,27 @@ import numpy as np
 # from pixel_counting import create_image as create_red_gradient_image
 
 
+def _hsv_bound(hue: int, sat: int, val: int) -> np.ndarray:
+	"""
+	Граница диапазона HSV: uint8, как ждёт cv2.inRange для uint8-изображения,
+	и только для чтения, так как разделяется всеми созданными масками.
+	"""
+	bound = np.array([hue, sat, val], dtype=np.uint8)
+	bound.flags.writeable = False
+	return bound
+
+
+# Границы диапазонов HSV (как и в pixel_counting из CV-1-12).
+# Красный занимает оба края шкалы тона
+HSV_RED_LOWER_1 = _hsv_bound(0, 100, 100)
+HSV_RED_UPPER_1 = _hsv_bound(10, 255, 255)
+HSV_RED_LOWER_2 = _hsv_bound(170, 100, 100)
+HSV_RED_UPPER_2 = _hsv_bound(180, 255, 255)
+
+HSV_BLUE_LOWER = _hsv_bound(100, 100, 100)
+HSV_BLUE_UPPER = _hsv_bound(130, 255, 255)
+
+
 class ColorMask:
 	"""
 	Контейнер диапазонов HSV для выделения цветов.
@@ -56,6 +87,9 @@ class ColorMask:
 	def __init__(self, color_name: str):
 		self.name = color_name
 		self.hsv_ranges: list[tuple[np.ndarray, np.ndarray]] = []
+		# Те же границы, уложенные в непрерывные (K, 3) uint8 массивы для слитого ядра
+		self._lowers = np.empty((0, 3), dtype=np.uint8)
+		self._uppers = np.empty((0, 3), dtype=np.uint8)
 
 	def add_hsv_range(self, hsv_range: tuple[np.ndarray, np.ndarray]) -> None:
 		"""
@@ -75,6 +109,9 @@ class ColorMask:
 			if value.shape != (3,):
 				raise ValueError("Каждая граница HSV должна быть вектором из 3 чисел")
 		self.hsv_ranges.append(hsv_range)
+		lower, upper = _to_uint8_bounds(*hsv_range)
+		self._lowers = np.vstack([self._lowers, lower])
+		self._uppers = np.vstack([self._uppers, upper])
 
 	def __iadd__(self, hsv_range: tuple[np.ndarray, np.ndarray]):
 		"""
@@ -83,12 +120,17 @@ class ColorMask:
 		self.add_hsv_range(hsv_range)
 		return self
 
-	def create_mask(self, image_hsv: np.ndarray) -> np.ndarray:
+	def create_mask(
+			self, image_hsv: np.ndarray, out: Optional[np.ndarray] = None
+		) -> np.ndarray:
 		"""
 		Создание маски для всех диапазонов цвета.
 
 		Args:
 			image_hsv (np.ndarray): Изображение в пространстве HSV.
+			out (np.ndarray, optional): (H, W) uint8 буфер для маски.
+				Если не задан или не подходит по размеру — выделяется новый.
+				Для cv2.UMat не используется.
 
 		Returns:
 			np.ndarray: Итоговая бинарная маска.
@@ -96,12 +138,396 @@ class ColorMask:
 		if not self.hsv_ranges:
 			raise ValueError(f"У маски {self.name} нет диапазонов HSV")
 
-		masks = [cv2.inRange(image_hsv, lower, upper) for lower, upper in self.hsv_ranges]
-		result_mask = masks[0]
-		for m in masks[1:]:
-			result_mask = cv2.bitwise_or(result_mask, m)
-		return result_mask
-		
+		if _can_fuse(image_hsv):
+			return _fused_mask(image_hsv, self._lowers, self._uppers, out)
+
+		if isinstance(image_hsv, cv2.UMat):
+			# T-API: маски остаются на устройстве OpenCL, объединяем там же
+			masks = (cv2.inRange(image_hsv, lower, upper) for lower, upper in self.hsv_ranges)
+			result_mask = next(masks)
+			for m in masks:
+				cv2.bitwise_or(result_mask, m, dst=result_mask)
+			return result_mask
+
+		return _inrange_sequential(image_hsv, self.hsv_ranges, out)
+
+
+# --- Слитое ядро выделения диапазонов ---
+# Ядра идут по строкам (как лежит C-массив) полосами по TILE_ROWS строк:
+# полоса входа и выхода 1080p-кадра (~64 * 1920 * 4 байт) целиком помещается в L2,
+# а потоки prange получают по целой полосе, а не по одной строке
+TILE_ROWS = 64
+
+# Число диапазонов, под которое у ядер есть развёрнутые варианты:
+# красный (два диапазона) + синий; при другом числе — общий цикл по диапазонам
+UNROLLED_RANGES = 3
+
+if _HAS_NUMBA:
+	# Ядра работают со строками изображения, вытянутыми в непрерывные
+	# одномерные массивы uint8: (W, 3) -> (3W,). Проверка диапазона считается
+	# в uint8 без ветвлений, и по такой строке LLVM векторизует цикл
+	# в упакованные сравнения байтов (см. замеры в README)
+
+	@njit(inline="always")
+	def _in_range(row, x, r):
+		"""
+		Лежит ли пиксель x строки row в диапазоне r из _range_bounds.
+
+		Проверка lower <= value <= upper делается одним беззнаковым сравнением:
+		uint8(value - lower) <= upper - lower. Значения ниже lower
+		«заворачиваются» в большие, так что ветвлений нет.
+		"""
+		return ((np.uint8(row[3 * x] - r[0]) <= r[3])
+			& (np.uint8(row[3 * x + 1] - r[1]) <= r[4])
+			& (np.uint8(row[3 * x + 2] - r[2]) <= r[5]))
+
+	@njit(inline="always")
+	def _range_bounds(lowers, spans, k):
+		"""
+		Границы k-го диапазона одним кортежем (lower_h, lower_s, lower_v, span_h, span_s, span_v).
+		"""
+		return (
+			lowers[k, 0], lowers[k, 1], lowers[k, 2],
+			spans[k, 0], spans[k, 1], spans[k, 2],
+		)
+
+	@njit(inline="always")
+	def _mask_row(row, out_row, lowers, spans):
+		"""
+		Маска строки по K диапазонам: первый диапазон записывается в out_row,
+		остальные объединяются с ней (ИЛИ). Каждый диапазон — отдельный
+		проход по строке, который целиком лежит в кэше.
+		"""
+		if lowers.shape[0] == 0:
+			out_row[:] = 0
+		for k in range(lowers.shape[0]):
+			r = _range_bounds(lowers, spans, k)
+			if k == 0:
+				for x in range(out_row.size):
+					out_row[x] = np.uint8(0) - np.uint8(_in_range(row, x, r))
+			else:
+				for x in range(out_row.size):
+					out_row[x] |= np.uint8(0) - np.uint8(_in_range(row, x, r))
+
+	@njit(inline="always")
+	def _mask_row3(row, out_row, lowers, spans):
+		"""
+		То же, что _mask_row, для ровно трёх диапазонов: все три проверяются
+		за один проход по строке.
+		"""
+		r0 = _range_bounds(lowers, spans, 0)
+		r1 = _range_bounds(lowers, spans, 1)
+		r2 = _range_bounds(lowers, spans, 2)
+		for x in range(out_row.size):
+			hit = _in_range(row, x, r0) | _in_range(row, x, r1) | _in_range(row, x, r2)
+			out_row[x] = np.uint8(0) - np.uint8(hit)
+
+	@njit(inline="always")
+	def _apply_row(row, mask_row, out_row):
+		"""
+		Применение строки маски (0 или 255) к строке BGR: побитовое И каждого канала.
+		"""
+		for x in range(mask_row.size):
+			m = mask_row[x]
+			out_row[3 * x] = row[3 * x] & m
+			out_row[3 * x + 1] = row[3 * x + 1] & m
+			out_row[3 * x + 2] = row[3 * x + 2] & m
+
+	@njit(parallel=True, fastmath=True, cache=True)
+	def _fused_inrange(hsv, lowers, spans, out):
+		"""
+		Один проход по HSV-изображению: пиксель попадает в маску,
+		если он лежит хотя бы в одном из K диапазонов.
+
+		Args:
+			hsv (np.ndarray): (H, W, 3) uint8, C-непрерывный.
+			lowers (np.ndarray): (K, 3) uint8, нижние границы.
+			spans (np.ndarray): (K, 3) uint8, ширины диапазонов upper - lower
+				(только непустые диапазоны: lower <= upper).
+			out (np.ndarray): (H, W) uint8, C-непрерывный; сюда пишется маска (0 или 255).
+		"""
+		height = out.shape[0]
+		n_tiles = (height + TILE_ROWS - 1) // TILE_ROWS
+		for tile in prange(n_tiles):
+			for y in range(tile * TILE_ROWS, min((tile + 1) * TILE_ROWS, height)):
+				_mask_row(hsv[y].reshape(-1), out[y], lowers, spans)
+
+	@njit(parallel=True, fastmath=True, cache=True)
+	def _fused_inrange3(hsv, lowers, spans, out):
+		"""
+		То же, что _fused_inrange, для ровно трёх диапазонов (см. _mask_row3).
+		"""
+		height = out.shape[0]
+		n_tiles = (height + TILE_ROWS - 1) // TILE_ROWS
+		for tile in prange(n_tiles):
+			for y in range(tile * TILE_ROWS, min((tile + 1) * TILE_ROWS, height)):
+				_mask_row3(hsv[y].reshape(-1), out[y], lowers, spans)
+
+	@njit(parallel=True, fastmath=True, cache=True)
+	def _extract_colors(bgr, hsv, lowers, spans, out_mask, out_bgr):
+		"""
+		Построение маски и её применение за один проход: строка маски
+		применяется к строке изображения, пока обе ещё в кэше.
+		Маска не перечитывается из памяти, как при _fused_inrange + cv2.bitwise_and.
+
+		Args:
+			bgr (np.ndarray): (H, W, 3) uint8, C-непрерывный, исходное изображение.
+			hsv (np.ndarray): (H, W, 3) uint8, C-непрерывный, то же изображение в HSV.
+			lowers (np.ndarray): (K, 3) uint8, нижние границы.
+			spans (np.ndarray): (K, 3) uint8, ширины непустых диапазонов.
+			out_mask (np.ndarray): (H, W) uint8, сюда пишется маска (0 или 255).
+			out_bgr (np.ndarray): (H, W, 3) uint8, сюда пишется результат.
+		"""
+		height = out_mask.shape[0]
+		n_tiles = (height + TILE_ROWS - 1) // TILE_ROWS
+		for tile in prange(n_tiles):
+			for y in range(tile * TILE_ROWS, min((tile + 1) * TILE_ROWS, height)):
+				_mask_row(hsv[y].reshape(-1), out_mask[y], lowers, spans)
+				_apply_row(bgr[y].reshape(-1), out_mask[y], out_bgr[y].reshape(-1))
+
+	@njit(parallel=True, fastmath=True, cache=True)
+	def _extract_colors3(bgr, hsv, lowers, spans, out_mask, out_bgr):
+		"""
+		То же, что _extract_colors, для ровно трёх диапазонов (см. _mask_row3).
+		"""
+		height = out_mask.shape[0]
+		n_tiles = (height + TILE_ROWS - 1) // TILE_ROWS
+		for tile in prange(n_tiles):
+			for y in range(tile * TILE_ROWS, min((tile + 1) * TILE_ROWS, height)):
+				_mask_row3(hsv[y].reshape(-1), out_mask[y], lowers, spans)
+				_apply_row(bgr[y].reshape(-1), out_mask[y], out_bgr[y].reshape(-1))
+
+
+def _can_fuse(image_hsv: np.ndarray) -> bool:
+	"""
+	Можно ли строить маску слитым ядром: нужна numba и обычное
+	трёхканальное uint8-изображение (numpy, не UMat), непрерывное в памяти,
+	так как ядра читают его строки как одномерные массивы.
+	"""
+	return (
+		_HAS_NUMBA
+		and isinstance(image_hsv, np.ndarray)
+		and image_hsv.dtype == np.uint8
+		and image_hsv.ndim == 3
+		and image_hsv.shape[2] == 3
+		and image_hsv.flags.c_contiguous
+	)
+
+
+def _buffer(out: Optional[np.ndarray], shape: tuple, dtype) -> np.ndarray:
+	"""
+	Буфер под результат: out, если он подходит по форме и типу
+	и непрерывен в памяти, иначе новый массив (так же поступает OpenCV
+	с аргументом dst).
+	"""
+	if (
+		out is not None and out.shape == tuple(shape) and out.dtype == dtype
+		and out.flags.c_contiguous
+	):
+		return out
+	return np.empty(shape, dtype=dtype)
+
+
+def _empty_mask(image_hsv: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+	"""
+	Нулевая маска под размер изображения (в out, если он подходит).
+	"""
+	out = _buffer(out, image_hsv.shape[:2], np.uint8)
+	out.fill(0)
+	return out
+
+
+# Пул потоков для независимых вызовов cv2.inRange: OpenCV отпускает GIL
+# на время вычислений, так что диапазоны действительно считаются параллельно
+_EXECUTOR: Optional[ThreadPoolExecutor] = None
+
+
+def _executor() -> ThreadPoolExecutor:
+	"""
+	Общий пул потоков (создаётся при первом обращении).
+	"""
+	global _EXECUTOR
+	if _EXECUTOR is None:
+		_EXECUTOR = ThreadPoolExecutor(max_workers=os.cpu_count())
+	return _EXECUTOR
+
+
+def _inrange_sequential(
+		image_hsv: np.ndarray, hsv_ranges: list[tuple[np.ndarray, np.ndarray]],
+		out: Optional[np.ndarray] = None
+	) -> np.ndarray:
+	"""
+	Объединение (ИЛИ) масок cv2.inRange по всем диапазонам в текущем потоке.
+
+	Первый диапазон пишется сразу в результат, остальные — в черновик из пула,
+	который объединяется с результатом на месте: новых буферов не выделяется.
+	"""
+	if not hsv_ranges:
+		return _empty_mask(image_hsv, out)
+
+	# (Упаковка масок в биты через np.packbits здесь не окупается: cv2.inRange
+	# всё равно пишет полную маску, а упаковка и распаковка — лишние проходы)
+	(lower, upper), *rest = hsv_ranges
+	result_mask = cv2.inRange(image_hsv, lower, upper, dst=out)
+	if rest:
+		scratch = _pooled(result_mask.shape, "range_scratch")
+	for lower, upper in rest:
+		cv2.inRange(image_hsv, lower, upper, dst=scratch)
+		cv2.bitwise_or(result_mask, scratch, dst=result_mask)
+	return result_mask
+
+
+def _inrange_parallel(
+		image_hsv: np.ndarray, hsv_ranges: list[tuple[np.ndarray, np.ndarray]],
+		out: Optional[np.ndarray] = None
+	) -> np.ndarray:
+	"""
+	Объединение (ИЛИ) масок cv2.inRange по всем диапазонам,
+	посчитанных параллельно в пуле потоков.
+
+	Первый диапазон считается в текущем потоке сразу в результат,
+	остальные — в пуле; их маски объединяются с результатом на месте
+	по мере готовности. Каждая задача пишет в свой буфер из пула
+	текущего потока, так что на кадр ничего не выделяется.
+	"""
+	if not hsv_ranges:
+		return _empty_mask(image_hsv, out)
+
+	(lower, upper), *rest = hsv_ranges
+	shape = image_hsv.shape[:2]
+	futures = [
+		_executor().submit(cv2.inRange, image_hsv, lo, hi, _pooled(shape, f"worker{i}"))
+		for i, (lo, hi) in enumerate(rest)
+	]
+	result_mask = cv2.inRange(image_hsv, lower, upper, dst=out)
+	for future in futures:
+		cv2.bitwise_or(result_mask, future.result(), dst=result_mask)
+	return result_mask
+
+
+def _to_uint8_bounds(
+		lower: np.ndarray, upper: np.ndarray
+	) -> tuple[np.ndarray, np.ndarray]:
+	"""
+	Приведение границ диапазона HSV к uint8 так же, как это делает
+	cv2.inRange для uint8-изображения: округление до ближайшего целого
+	и насыщение до 0..255.
+
+	Если нижняя граница после округления больше 255 или верхняя меньше 0,
+	диапазону не соответствует ни одно значение; такой диапазон
+	возвращается пустым (нижняя граница 255 больше верхней 0).
+	"""
+	lower, upper = np.rint(lower), np.rint(upper)
+	if (lower > 255).any() or (upper < 0).any():
+		return np.full(3, 255, dtype=np.uint8), np.zeros(3, dtype=np.uint8)
+	return np.clip(lower, 0, 255).astype(np.uint8), np.clip(upper, 0, 255).astype(np.uint8)
+
+
+def _fused_mask(
+		image_hsv: np.ndarray, lowers: np.ndarray, uppers: np.ndarray,
+		out: Optional[np.ndarray] = None
+	) -> np.ndarray:
+	"""
+	Маска по всем диапазонам за один вызов слитого ядра.
+
+	Args:
+		image_hsv (np.ndarray): (H, W, 3) uint8 HSV-изображение.
+		lowers (np.ndarray): (K, 3) uint8, нижние границы.
+		uppers (np.ndarray): (K, 3) uint8, верхние границы.
+		out (np.ndarray, optional): (H, W) uint8 буфер для маски.
+	"""
+	lowers, spans = _range_spans(lowers, uppers)
+	out = _buffer(out, image_hsv.shape[:2], np.uint8)
+	if lowers.shape[0] == UNROLLED_RANGES:
+		_fused_inrange3(image_hsv, lowers, spans, out)
+	else:
+		_fused_inrange(image_hsv, lowers, spans, out)
+	return out
+
+
+def _range_spans(lowers: np.ndarray, uppers: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+	"""
+	Нижние границы и ширины (upper - lower) непустых диапазонов для ядер numba.
+
+	Диапазон с lower > upper хоть в одном канале пуст (как и у cv2.inRange),
+	а трюку с беззнаковым сравнением нужна неотрицательная ширина.
+	"""
+	nonempty = (lowers <= uppers).all(axis=1)
+	lowers = lowers[nonempty]
+	return lowers, uppers[nonempty] - lowers
+
+
+# --- Перевод в HSV ---
+def convert_to_hsv(
+		image_bgr: np.ndarray, out: Optional[np.ndarray] = None
+	) -> np.ndarray:
+	"""
+	Перевод BGR-изображения в HSV.
+
+	Args:
+		image_bgr (np.ndarray): Изображение в формате BGR.
+		out (np.ndarray, optional): (H, W, 3) uint8 буфер для HSV-изображения.
+			Для cv2.UMat не используется.
+
+	Returns:
+		np.ndarray: Изображение в пространстве HSV.
+	"""
+	if isinstance(image_bgr, cv2.UMat):
+		return cv2.cvtColor(image_bgr, cv2.COLOR_BGR2HSV)
+	return cv2.cvtColor(image_bgr, cv2.COLOR_BGR2HSV, dst=out)
+
+
+# --- Пул буферов ---
+# Буферы под промежуточные изображения: форма -> {имя: массив}.
+# У каждого потока свой пул, так что параллельные вызовы не делят буферы
+_POOL = threading.local()
+
+
+def _pooled(shape: tuple, name: str) -> np.ndarray:
+	"""
+	uint8-буфер с именем name заданной формы из пула текущего потока.
+
+	Выделяется при первом запросе и отдаётся всем следующим запросам
+	с той же формой и именем; прежнее содержимое при этом не сохраняется.
+	"""
+	pool = getattr(_POOL, "buffers", None)
+	if pool is None:
+		pool = _POOL.buffers = {}
+	buffers = pool.setdefault(tuple(shape), {})
+	buffer = buffers.get(name)
+	if buffer is None:
+		buffer = buffers[name] = np.empty(shape, dtype=np.uint8)
+	return buffer
+
+
+def _frame_buffers(shape: tuple) -> dict[str, np.ndarray]:
+	"""
+	Буферы для обработки uint8-кадра заданной формы: "hsv", "mask", "result".
+
+	Выделяются при первом кадре такого размера и отдаются всем следующим,
+	так что при потоковой обработке память не выделяется заново на каждый кадр.
+	Содержимое буферов перезаписывается следующим кадром того же размера.
+	"""
+	height, width = shape[:2]
+	return {
+		"hsv":    _pooled((height, width, 3), "hsv"),
+		"mask":   _pooled((height, width), "mask"),
+		"result": _pooled(shape, "result"),
+	}
+
+
+# --- Вычисления на OpenCL (T-API) ---
+# Начиная с какого числа пикселей кадр выгоднее отдать на OpenCL, чем считать на CPU
+OPENCL_MIN_PIXELS = 1920 * 1080
+
+
+def _use_opencl(image_bgr: np.ndarray) -> bool:
+	"""
+	Стоит ли оборачивать кадр в cv2.UMat: OpenCL доступен и включён,
+	а кадр достаточно велик, чтобы окупить передачу на устройство.
+	"""
+	height, width = image_bgr.shape[:2]
+	return cv2.ocl.useOpenCL() and height * width >= OPENCL_MIN_PIXELS
 
 
 # --- Шаг 1. Создание маски для красного ---
@@ -110,8 +536,8 @@ def create_red_mask() -> ColorMask:
 	Создание готовой маски для красного.
 	"""
 	cm = ColorMask("red")
-	cm += (np.array([0, 100, 100]), np.array([10, 255, 255]))
-	cm += (np.array([170, 100, 100]), np.array([180, 255, 255]))
+	cm += (HSV_RED_LOWER_1, HSV_RED_UPPER_1)
+	cm += (HSV_RED_LOWER_2, HSV_RED_UPPER_2)
 	return cm
 
 
@@ -121,39 +547,65 @@ def create_blue_mask() -> ColorMask:
 	Создание готовой маски для синего.
 	"""
 	cm = ColorMask("blue")
-	cm += (np.array([100, 100, 100]), np.array([130, 255, 255]))
+	cm += (HSV_BLUE_LOWER, HSV_BLUE_UPPER)
 	return cm
 
 
 # --- Шаг 3. Объединение масок ---
-def combine_masks(masks: list[ColorMask], image_hsv: np.ndarray) -> np.ndarray:
+def combine_masks(
+		masks: list[ColorMask], image_hsv: np.ndarray,
+		out: Optional[np.ndarray] = None
+	) -> np.ndarray:
 	"""
 	Создание итоговой маски из нескольких ColorMask.
 
 	Args:
 		masks (list[ColorMask]): список масок.
 		image_hsv (np.ndarray): HSV-изображение.
+		out (np.ndarray, optional): (H, W) uint8 буфер для итоговой маски.
 
 	Returns:
 		np.ndarray: итоговая бинарная маска.
 	"""
 	if not masks:
 		raise ValueError("Список масок пуст")
+	for cm in masks:
+		if not cm.hsv_ranges:
+			raise ValueError(f"У маски {cm.name} нет диапазонов HSV")
+
+	if _can_fuse(image_hsv):
+		# Все диапазоны всех цветов — за один проход по изображению
+		lowers = np.vstack([cm._lowers for cm in masks])
+		uppers = np.vstack([cm._uppers for cm in masks])
+		return _fused_mask(image_hsv, lowers, uppers, out)
+
+	if isinstance(image_hsv, cv2.UMat):
+		# T-API: копим ИЛИ на устройстве в маске первого цвета
+		result_mask = masks[0].create_mask(image_hsv)
+		for cm in masks[1:]:
+			cv2.bitwise_or(result_mask, cm.create_mask(image_hsv), dst=result_mask)
+		return result_mask
 
-	result_mask = masks[0].create_mask(image_hsv)
-	for cm in masks[1:]:
-		result_mask = cv2.bitwise_or(result_mask, cm.create_mask(image_hsv))
-	return result_mask
+	hsv_ranges = [r for cm in masks for r in cm.hsv_ranges]
+	if (os.cpu_count() or 1) > 1:
+		# Диапазоны всех цветов независимы — считаем их параллельно
+		return _inrange_parallel(image_hsv, hsv_ranges, out)
+	return _inrange_sequential(image_hsv, hsv_ranges, out)
 
 
 # --- Шаг 4. Применение маски к изображению ---
-def apply_mask(image_bgr: np.ndarray, mask: np.ndarray) -> np.ndarray:
+def apply_mask(
+		image_bgr: np.ndarray, mask: np.ndarray,
+		out: Optional[np.ndarray] = None
+	) -> np.ndarray:
 	"""
 	Применение маски к изображению.
 
 	Args:
 		image_bgr (np.ndarray): Исходное изображение в формате BGR.
 		mask (np.ndarray): Двоичная маска (одноканальное изображение).
+		out (np.ndarray, optional): Буфер для результата той же формы и типа,
+			что и image_bgr. Для cv2.UMat не используется.
 
 	Returns:
 		np.ndarray: Новое изображение, где сохраняются только пиксели,
@@ -163,7 +615,13 @@ def apply_mask(image_bgr: np.ndarray, mask: np.ndarray) -> np.ndarray:
 		ValueError: Если входное изображение или маска пусты,
 		либо если размеры не совпадают.
 	"""
-	
+	if isinstance(image_bgr, cv2.UMat) or isinstance(mask, cv2.UMat):
+		# T-API: размеры UMat без выгрузки с устройства не узнать,
+		# их несовпадение OpenCV сообщит сам (cv2.error)
+		if image_bgr is None or mask is None:
+			raise ValueError("Входное изображение или маска равны None")
+		return cv2.bitwise_and(image_bgr, image_bgr, mask=mask)
+
 	if image_bgr is None or image_bgr.size == 0:
 		raise ValueError("Входное изображение пустое или None")
 
@@ -176,9 +634,72 @@ def apply_mask(image_bgr: np.ndarray, mask: np.ndarray) -> np.ndarray:
 			f"и маски {mask.shape[:2]} не совпадают"
 		)
 
-	# Применение маски: оставляем только белые области, остальные зануляем
-	result = cv2.bitwise_and(image_bgr, image_bgr, mask=mask)
-	return result
+	# Маска (H, W, 1), как и у cv2.bitwise_and, допустима: приводим её к (H, W)
+	if mask.ndim == 3 and mask.shape[2] == 1:
+		mask = mask.reshape(mask.shape[:2])
+	if mask.ndim != 2:
+		raise ValueError(f"Маска должна быть одноканальной, получена форма {mask.shape}")
+
+	# Применение маски: оставляем только белые области, остальные зануляем.
+	# cv2.bitwise_and с маской не трогает пиксели вне её, поэтому
+	# переиспользуемый буфер out сначала обнуляется
+	if out is not None and out.shape == image_bgr.shape and out.dtype == image_bgr.dtype:
+		out.fill(0)
+	else:
+		out = None
+	return cv2.bitwise_and(image_bgr, image_bgr, mask=mask, dst=out)
+
+
+# --- Шаги 3 и 4 разом ---
+def extract_colors(
+		image_bgr: np.ndarray, image_hsv: np.ndarray, masks: list[ColorMask],
+		out_mask: Optional[np.ndarray] = None, out_bgr: Optional[np.ndarray] = None
+	) -> tuple[np.ndarray, np.ndarray]:
+	"""
+	Объединение масок и их применение к изображению за один проход.
+
+	Равносильно combine_masks + apply_mask, но при наличии numba изображение
+	читается один раз, а итоговая маска не перечитывается из памяти.
+
+	Args:
+		image_bgr (np.ndarray): Исходное изображение в формате BGR.
+		image_hsv (np.ndarray): То же изображение в пространстве HSV.
+		masks (list[ColorMask]): список масок.
+		out_mask (np.ndarray, optional): (H, W) uint8 буфер для итоговой маски.
+		out_bgr (np.ndarray, optional): Буфер для результата той же формы и типа,
+			что и image_bgr.
+
+	Returns:
+		tuple[np.ndarray, np.ndarray]: итоговая бинарная маска и изображение,
+		где сохранены только пиксели, попавшие в маску.
+
+	Raises:
+		ValueError: Как и у combine_masks и apply_mask.
+	"""
+	if (
+		masks
+		and all(cm.hsv_ranges for cm in masks)
+		and _can_fuse(image_hsv)
+		# ядро пишет результат побайтно: BGR тоже трёхканальное uint8
+		and _can_fuse(image_bgr)
+		and image_bgr.size > 0
+		and image_bgr.shape[:2] == image_hsv.shape[:2]
+	):
+		lowers, spans = _range_spans(
+			np.vstack([cm._lowers for cm in masks]),
+			np.vstack([cm._uppers for cm in masks]),
+		)
+		mask = _buffer(out_mask, image_hsv.shape[:2], np.uint8)
+		result = _buffer(out_bgr, image_bgr.shape, image_bgr.dtype)
+		if lowers.shape[0] == UNROLLED_RANGES:
+			_extract_colors3(image_bgr, image_hsv, lowers, spans, mask, result)
+		else:
+			_extract_colors(image_bgr, image_hsv, lowers, spans, mask, result)
+		return mask, result
+
+	# Пошагово; здесь же проверяются и все ошибочные входные данные
+	mask = combine_masks(masks, image_hsv, out=out_mask)
+	return mask, apply_mask(image_bgr, mask, out=out_bgr)
 
 
 # --- Шаг 5. Отобразить результат ---
@@ -197,16 +718,20 @@ def show_result(original: np.ndarray, mask: np.ndarray, result: np.ndarray) -> N
 	Raises:
 		ValueError: Если одно из изображений пустое.
 	"""
+	# Изображения на устройстве OpenCL выгружаются один раз, только для показа
+	if isinstance(mask, cv2.UMat):
+		mask = mask.get()
+	if isinstance(result, cv2.UMat):
+		result = result.get()
 
-	print("Type any key to proceed")
+	# Все три окна показываются сразу, ожидание клавиши — одно
 	cv2.imshow("Original", original)
 	print("Original Image")
-	cv2.waitKey(0)
 	cv2.imshow("Combined Mask", mask)
 	print("Combined Mask")
-	cv2.waitKey(0)
 	cv2.imshow("Result", result)
 	print("Result Image")
+	print("Type any key to proceed")
 	cv2.waitKey(0)
 	cv2.destroyAllWindows()
 
@@ -234,14 +759,23 @@ def main_process_file(img_path: str) -> None:
 	img_bgr = cv2.imread(img_path, cv2.IMREAD_COLOR)
 	if img_bgr is None:
 		raise ValueError(f"Не удалось загрузить изображение: {img_path}")
-	img_hsv = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2HSV)
+
+	# Большие кадры обрабатываем через T-API: cvtColor, inRange, bitwise_*
+	# уходят на OpenCL, а данные остаются на устройстве до show_result
+	img = cv2.UMat(img_bgr) if _use_opencl(img_bgr) else img_bgr
+	# Промежуточные изображения пишутся в буферы пула; память под UMat
+	# OpenCV выделяет на устройстве сам
+	buffers = {} if isinstance(img, cv2.UMat) else _frame_buffers(img_bgr.shape)
+	img_hsv = convert_to_hsv(img, out=buffers.get("hsv"))
 
 	mask_red: ColorMask  = create_red_mask()
 	mask_blue: ColorMask = create_blue_mask()
 	masks: list[ColorMask] = [mask_red, mask_blue]
 
-	combined_mask: np.ndarray = combine_masks(masks, img_hsv)
-	result: np.ndarray   = apply_mask(img_bgr, combined_mask)
+	combined_mask, result = extract_colors(
+		img, img_hsv, masks,
+		out_mask=buffers.get("mask"), out_bgr=buffers.get("result")
+	)
 
 	show_result(img_bgr, combined_mask, result)
 
@@ -259,10 +793,12 @@ def create_hue_gradient_python(width=360, height=100) -> np.ndarray:
 	Returns:
 		np.ndarray: градиентное изображение в формате BGR.
 	"""
-	gradient = np.zeros((height, width, 3), dtype=np.uint8)
-	for x in range(width):
-		hue = int((x / width) * 179)
-		gradient[:, x] = (hue, 255, 255)  # HSV
+	# Целочисленный аналог int((x / width) * 179) сразу для всех столбцов
+	hues = (np.arange(width) * 179 // width).astype(np.uint8)
+
+	gradient = np.empty((height, width, 3), dtype=np.uint8)
+	gradient[..., 0] = hues[None, :]
+	gradient[..., 1:] = 255  # S и V
 	return cv2.cvtColor(gradient, cv2.COLOR_HSV2BGR)
 
 def create_hue_gradient_numpy(width=360, height=100) -> np.ndarray:
@@ -279,12 +815,12 @@ def create_hue_gradient_numpy(width=360, height=100) -> np.ndarray:
 	"""
 	# Генерация линейного градиента HUE от 0 до 179
 	hues = np.linspace(0, 179, width, dtype=np.uint8)
-	hue_channel = np.tile(hues, (height, 1))
-
-	sat_channel = np.full((height, width), 255, dtype=np.uint8)
-	val_channel = np.full((height, width), 255, dtype=np.uint8)
 
-	hsv_image = cv2.merge([hue_channel, sat_channel, val_channel])
+	# Каналы пишутся сразу в итоговое (H, W, 3) изображение,
+	# без отдельных плоскостей и копирования через cv2.merge
+	hsv_image = np.empty((height, width, 3), dtype=np.uint8)
+	hsv_image[..., 0] = hues[None, :]
+	hsv_image[..., 1:] = 255  # S и V
 	return cv2.cvtColor(hsv_image, cv2.COLOR_HSV2BGR)
 
 def example_synthetic() -> None:
@@ -293,14 +829,13 @@ def example_synthetic() -> None:
 	Выбираем 
 	"""
 	img_bgr: np.ndarray = create_hue_gradient_numpy(width=720, height=200)
-	img_hsv = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2HSV)
+	img_hsv = convert_to_hsv(img_bgr)
 	
 	mask_red: ColorMask  = create_red_mask()
 	mask_blue: ColorMask = create_blue_mask()
 	masks: list[ColorMask] = [mask_red, mask_blue]
 
-	combined_mask: np.ndarray = combine_masks(masks, img_hsv)
-	result: np.ndarray   = apply_mask(img_bgr, combined_mask)
+	combined_mask, result = extract_colors(img_bgr, img_hsv, masks)
 
 	show_result(img_bgr, combined_mask, result)
 
@@ -27,6 +27,7 @@ DA-1-35: Работа с timeseries.
 
 import os
 import argparse
+import numpy as np
 import pandas as pd
 
 
@@ -112,6 +113,10 @@ def convert_to_datetime(df: pd.DataFrame) -> pd.DataFrame:
 	if "timestamp" not in df.columns:
 		raise KeyError("Отсутствует обязательный столбец 'timestamp'.")
 
+	if pd.api.types.is_datetime64_any_dtype(df["timestamp"]):
+		# Столбец уже datetime64 (например, из pd.date_range) — разбирать нечего
+		return df.copy()
+
 	try:
 		result = df.copy()
 		
@@ -147,17 +152,34 @@ def extract_parts(df: pd.DataFrame) -> pd.DataFrame:
 	if not pd.api.types.is_datetime64_any_dtype(df["timestamp"]):
 		raise TypeError("Столбец 'timestamp' должен быть формата datetime.")
 
-	new_df = pd.DataFrame()
+	timestamps = df["timestamp"]
+	if isinstance(timestamps.dtype, pd.DatetimeTZDtype):
+		# .values хранит UTC; части даты нужны в местном времени столбца
+		timestamps = timestamps.dt.tz_localize(None)
+
+	# Извлечение искомых признаков арифметикой над datetime64
+	# вместо трёх отдельных проходов .dt.day / .dt.month / .dt.year.
+	# Метки последовательно огрубляются до дней, месяцев и лет (каждое приведение —
+	# один раз), а поля получаются разностями соседних единиц
+	days = timestamps.to_numpy().astype("datetime64[D]")
+	months = days.astype("datetime64[M]")
+	years = months.astype("datetime64[Y]")
+	parts = {
+		"day":   (days - months).astype(np.int32) + 1,
+		"month": (months - years).astype(np.int32) + 1,
+		"year":  years.astype(np.int32) + 1970,
+	}
+
+	missing = np.isnat(days)
+	if missing.any():
+		# Как и у .dt-аксессоров: для NaT получаем NaN
+		parts = {name: np.where(missing, np.nan, part) for name, part in parts.items()}
 
 	# Добавление полного столбца для проверки datetime правильности.
-	# new_df["timestamp"] = df["timestamp"]
-
-	# Извлечение искомых признаков
-	new_df["day"]   = df["timestamp"].dt.day
-	new_df["month"] = df["timestamp"].dt.month
-	new_df["year"]  = df["timestamp"].dt.year
+	# parts["timestamp"] = df["timestamp"]
 
-	return new_df.copy()  # копируем заполненный экземпляр из функции.
+	# Таблица собирается один раз, без промежуточных копий
+	return pd.DataFrame(parts, index=df.index)
 
 
 def example_main_synthetic():